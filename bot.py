@@ -1,15 +1,33 @@
 import os
 import json
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from telegram import ParseMode, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Updater, CommandHandler, CallbackQueryHandler, CallbackContext, MessageHandler, Filters
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.constants import ParseMode
+from telegram.helpers import escape_markdown
+from telegram.error import RetryAfter
+from telegram.ext import ApplicationBuilder, CommandHandler, CallbackQueryHandler, CallbackContext, MessageHandler, filters
 import asyncio
+from collections import defaultdict
 import aiohttp
-import threading
+import functools
 import logging
+import mmap
+import secrets
+import sqlite3
+import time
+from solana.rpc.websocket_api import connect
+from solders.pubkey import Pubkey
+from solders.rpc.config import RpcTransactionLogsFilterMentions
+from solders.rpc.responses import SubscriptionError, SubscriptionResult
 from pathlib import Path
+from keep_alive import keep_alive
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib json module
+    orjson = None
 
 # Load environment variables
 load_dotenv()
@@ -53,6 +71,159 @@ TRANSACTIONS_FILE = 'transactions.json'
 # API settings
 MORALIS_API_KEY = os.getenv('MORALIS_API_KEY')
 MORALIS_API_URL = "https://solana-gateway.moralis.io/account/mainnet"
+SOLANA_WS_URL = os.getenv('SOLANA_WS_URL')  # Optional, enables push-triggered checks
+OWNER_CHAT_ID = os.getenv('OWNER_CHAT_ID')  # Optional, owns wallets imported without a chat
+if OWNER_CHAT_ID:
+    # Validate once at startup rather than on every alert
+    try:
+        OWNER_CHAT_ID = int(OWNER_CHAT_ID)
+    except ValueError:
+        raise SystemExit(f"OWNER_CHAT_ID must be a numeric Telegram chat ID, got {OWNER_CHAT_ID!r}")
+else:
+    OWNER_CHAT_ID = None
+# One-time code for /claim, logged at startup so only the operator can link unowned wallets
+CLAIM_CODE = secrets.token_urlsafe(8)
+
+# Transaction check intervals in seconds
+POLL_INTERVAL = 60
+RECONCILE_INTERVAL = 600  # Used instead of POLL_INTERVAL when SOLANA_WS_URL is set
+PUSH_DEBOUNCE_DELAY = 2  # Seconds a push-triggered check waits so a burst of notifications shares one fetch
+PUSH_MIN_INTERVAL = 10  # Minimum seconds between push-triggered checks of the same wallet
+PUSH_FOLLOW_UP_DELAY = 20  # Seconds before re-checking a notified wallet, as Moralis indexes swaps behind the chain
+MAX_CONCURRENT_REQUESTS = 20  # Maximum wallets fetched from Moralis at once
+MORALIS_REQUESTS_PER_SECOND = 5  # Sustained Moralis request rate
+MORALIS_BURST = 10  # Requests allowed in a burst before rate limiting kicks in
+MAX_CONCURRENT_SENDS = 25  # Alert messages sent to Telegram at once, below its ~30/s bot limit
+SUMMARY_CACHE_TTL = 30  # Seconds an activity summary is reused while no new transactions are written
+ALERT_WINDOW_HOURS = 6  # Multi-buys/sells must happen within this many hours
+TRANSACTION_RETENTION_DAYS = 30  # Stored transactions older than this are deleted
+PRUNE_INTERVAL = 86400  # Seconds between history pruning runs
+
+# Moralis swap sub-categories that count as buys/sells
+BUY_SUB_CATEGORY = 'newPosition'
+SELL_SUB_CATEGORY = 'sellAll'
+TRACKED_SUB_CATEGORIES = frozenset((BUY_SUB_CATEGORY, SELL_SUB_CATEGORY))
+
+# Keyboards shared by all handlers
+BACK_TO_MENU_BUTTON = InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')
+BACK_TO_MENU = InlineKeyboardMarkup([[BACK_TO_MENU_BUTTON]])
+MODIFY_WALLET_MENU = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✏️ Change Name", callback_data='change_name')],
+    [InlineKeyboardButton("🔄 Change Address", callback_data='change_address')],
+    [BACK_TO_MENU_BUTTON]
+])
+MAIN_MENU = InlineKeyboardMarkup([
+    [
+        InlineKeyboardButton("➕ Add", callback_data='add_wallet'),
+        InlineKeyboardButton("➖ Remove", callback_data='remove_wallet'),
+        InlineKeyboardButton("✏️ Modify", callback_data='modify_wallet')
+    ],
+    [
+        InlineKeyboardButton("📝 List", callback_data='list_wallets'),
+        InlineKeyboardButton("🔍 Track", callback_data='track_token'),
+        InlineKeyboardButton("🔔 Alerts", callback_data='toggle_alerts')
+    ]
+])
+
+def json_loads(data):
+    """
+    Deserialize JSON from str or bytes, using orjson when available.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps(obj) -> bytes:
+    """
+    Serialize an object to UTF-8 JSON bytes, using orjson when available.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+@functools.lru_cache(maxsize=4096)
+def wallet_pubkey(address: str) -> Pubkey:
+    """
+    Parse a wallet address into a Pubkey, caching the result since tracked
+    addresses are re-subscribed on every reconnect.
+    """
+    return Pubkey.from_string(address)
+
+def is_valid_wallet_address(address: str) -> bool:
+    """
+    Check that an address parses as a Solana public key.
+    
+    Args:
+        address (str): The address to check
+        
+    Returns:
+        bool: True if the address is a valid public key, False otherwise
+    """
+    try:
+        wallet_pubkey(address)
+    except ValueError:
+        return False
+    return True
+
+def signed_value(value: Optional[float], is_buy) -> Optional[float]:
+    """
+    Sign a swap's value as a flow for its wallet: buys are outflows, sells
+    are inflows. Unknown values stay None so SQL aggregates skip them.
+    """
+    if value is None:
+        return None
+    return -value if is_buy else value
+
+def load_json_file(path):
+    """
+    Load a JSON file by parsing a read-only memory map of it, so the kernel
+    pages the file in on demand instead of copying it into a separate buffer.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return json_loads(b'')  # mmap can't map empty files; raises a decode error
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if orjson is not None:
+                with memoryview(mm) as view:
+                    return orjson.loads(view)
+            return json.loads(mm[:])
+
+class TokenBucket:
+    """
+    An asyncio token bucket that allows bursts of up to `capacity` requests
+    and refills at `rate` tokens per second.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initialize a full bucket.
+        
+        Args:
+            rate (float): Tokens added per second
+            capacity (float): Maximum number of tokens held
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, cost: float = 1):
+        """
+        Wait until enough tokens are available, then take them.
+        
+        Args:
+            cost (float): Number of tokens to take
+        """
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= cost:
+                    self.tokens -= cost
+                    return
+                await asyncio.sleep((cost - self.tokens) / self.rate)
 
 class WalletTracker:
     """
@@ -66,128 +237,281 @@ class WalletTracker:
         Sets up dictionaries for wallets, tracked tokens, and transactions.
         """
         self.wallets = {}  # Dictionary to store wallet addresses and their details
+        self.wallets_version = 0  # Bumped on every wallet change, used to invalidate cached keyboards
         self.tracked_tokens = {}  # Dictionary to store tracked token information
-        self.transactions = {}  # Dictionary to store transaction history
+        self.db = None  # SQLite connection holding wallets, tracked tokens and transaction history
+        self.parsed_swaps = {}  # Parsed swaps by signature, so repeat fetches skip re-parsing
+        self.latest_swap_times = {}  # Newest swap timestamp fetched per wallet, so polls only ask for newer swaps
+        self.summary_cache = {}  # Activity summaries keyed by window hours, as (computed_at, summary)
         self.alerts_enabled = True  # Flag to control alert notifications
-        self.last_api_calls = {}  # Dictionary to track last API call time for each wallet
+        self.has_unowned = False  # Whether any wallet has no chat, i.e. was imported from the legacy JSON files
+        self.last_api_calls = {}  # Monotonic time of the last API call for each wallet
+        self.last_push_checks = {}  # Monotonic time of the last push-triggered check scheduled for each wallet
         self.min_buys_for_alert = 3  # Minimum number of buys required to trigger an alert
         self.min_sells_for_alert = 3  # Minimum number of sells required to trigger an alert
-        self.load_data()  # Load existing data from files
+        self.load_data()  # Load existing data from the database
         logging.info("WalletTracker initialized")
 
     def load_data(self):
         """
-        Load all data from JSON files in the data directory.
-        Creates the data directory and files if they don't exist.
-        Handles errors gracefully by initializing empty data structures if loading fails.
+        Open the tracker database in the data directory and load wallets and
+        tracked tokens into memory.
+        Creates the data directory if it doesn't exist.
+        Handles errors gracefully by falling back to an in-memory database if
+        the database file can't be opened at all.
         """
         try:
             # Create data directory if it doesn't exist
             data_dir = Path("data")
             data_dir.mkdir(exist_ok=True)
-            
-            # Define file paths for data storage
-            wallets_file = data_dir / "tracked_wallets.json"
-            tokens_file = data_dir / "tracked_tokens.json"
-            transactions_file = data_dir / "transactions.json"
-            
-            # Create files with empty data structures if they don't exist
-            if not wallets_file.exists():
-                wallets_file.write_text("{}")
-            if not tokens_file.exists():
-                tokens_file.write_text("{}")
-            if not transactions_file.exists():
-                transactions_file.write_text("{}")
-            
-            # Load wallets with error handling
-            try:
-                with open(wallets_file, 'r') as f:
-                    self.wallets = json.load(f)
-                logging.info(f"Loaded {len(self.wallets)} wallets")
-            except Exception as e:
-                logging.error(f"Error loading wallets: {e}")
-                self.wallets = {}
-            
-            # Load tracked tokens with error handling
-            try:
-                with open(tokens_file, 'r') as f:
-                    self.tracked_tokens = json.load(f)
-                logging.info(f"Loaded {len(self.tracked_tokens)} tracked tokens")
-            except Exception as e:
-                logging.error(f"Error loading tracked tokens: {e}")
-                self.tracked_tokens = {}
-            
-            # Load transactions with error handling
-            try:
-                with open(transactions_file, 'r') as f:
-                    self.transactions = json.load(f)
-                logging.info(f"Loaded {len(self.transactions)} transaction records")
-            except Exception as e:
-                logging.error(f"Error loading transactions: {e}")
-                self.transactions = {}
-                
+            self.open_database(data_dir)
         except Exception as e:
-            logging.error(f"Error in load_data: {e}")
+            logging.error(f"Error opening database: {e}")
+            if self.db is not None:
+                # Never swap an opened tracker database for an empty one
+                raise
+            self.db = sqlite3.connect(":memory:")
+            self.create_schema()
+        
+        # Load wallets with error handling
+        try:
+            self.wallets = {
+                address: {'name': name, 'chat_id': chat_id, 'added_at': added_at}
+                for address, name, chat_id, added_at in self.db.execute(
+                    "SELECT address, name, chat_id, added_at FROM wallets ORDER BY rowid"
+                )
+            }
+            logging.info(f"Loaded {len(self.wallets)} wallets")
+        except Exception as e:
+            logging.error(f"Error loading wallets: {e}")
             self.wallets = {}
+        
+        # Wallets imported from the legacy JSON files have no chat yet
+        self.has_unowned = any(data['chat_id'] is None for data in self.wallets.values())
+        if self.has_unowned:
+            if OWNER_CHAT_ID is not None:
+                self.claim_unowned_wallets(OWNER_CHAT_ID)
+            else:
+                wallet_logger.warning(
+                    f"Some wallets have no chat and their alerts can't be delivered. "
+                    f"Send /claim {CLAIM_CODE} to the bot to link them to your chat, "
+                    f"or set OWNER_CHAT_ID"
+                )
+        
+        # Load tracked tokens with error handling
+        try:
+            self.tracked_tokens = {
+                token_address: {'wallets': json_loads(wallets), 'added_at': added_at}
+                for token_address, wallets, added_at in self.db.execute(
+                    "SELECT token_address, wallets, added_at FROM tracked_tokens ORDER BY rowid"
+                )
+            }
+            logging.info(f"Loaded {len(self.tracked_tokens)} tracked tokens")
+        except Exception as e:
+            logging.error(f"Error loading tracked tokens: {e}")
             self.tracked_tokens = {}
-            self.transactions = {}
 
-    def save_data(self):
+    def open_database(self, data_dir):
         """
-        Save all data to JSON files in the data directory.
-        Creates the data directory if it doesn't exist.
-        Handles errors gracefully and logs any issues.
+        Open the SQLite tracker database in WAL mode.
+        Imports the legacy JSON data files on first run.
+        
+        Args:
+            data_dir (Path): The data directory holding the database
         """
+        db_file = data_dir / "tracker.db"
+        self.db = sqlite3.connect(db_file)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.create_schema()
+        
+        self.import_legacy_file(data_dir / "tracked_wallets.json", self.import_wallets)
+        self.import_legacy_file(data_dir / "tracked_tokens.json", self.import_tracked_tokens)
+        self.import_legacy_file(
+            data_dir / "transactions.json",
+            lambda legacy: self.insert_transactions(list(legacy.items()))
+        )
+        
+        count = self.db.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        logging.info(f"Loaded {count} transaction records")
+
+    def import_legacy_file(self, path, import_data):
+        """
+        Import an old JSON data file, then rename it to .json.bak so it is
+        only imported once. A file that fails to load or import is logged and
+        left in place without affecting the rest of the database.
+        
+        Args:
+            path (Path): The JSON file to import
+            import_data (Callable[[Dict], None]): Writes the loaded data to the database
+        """
+        if not path.exists():
+            return
         try:
-            # Create data directory if it doesn't exist
-            data_dir = Path("data")
-            data_dir.mkdir(exist_ok=True)
-            
-            # Save wallets to file
-            with open(data_dir / "tracked_wallets.json", 'w') as f:
-                json.dump(self.wallets, f)
-            logging.info(f"Saved {len(self.wallets)} wallets")
-            
-            # Save tracked tokens to file
-            with open(data_dir / "tracked_tokens.json", 'w') as f:
-                json.dump(self.tracked_tokens, f)
-            logging.info(f"Saved {len(self.tracked_tokens)} tracked tokens")
-            
-            # Save transactions to file
-            with open(data_dir / "transactions.json", 'w') as f:
-                json.dump(self.transactions, f)
-            logging.info(f"Saved {len(self.transactions)} transaction records")
-                
+            legacy = load_json_file(path)
+            import_data(legacy)
         except Exception as e:
-            logging.error(f"Error in save_data: {e}")
+            # Leave the file in place so it can be fixed and imported on the next start
+            logging.error(f"Error importing {path}, leaving it unimported: {e}")
+            return
+        path.rename(path.with_suffix(".json.bak"))
+        logging.info(f"Imported {len(legacy)} records from {path}")
+
+    def import_wallets(self, wallets: Dict):
+        """
+        Insert wallets loaded from the legacy tracked_wallets.json file.
+        
+        Args:
+            wallets (Dict): Wallet details keyed by address
+        """
+        with self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO wallets VALUES (?, ?, ?, ?)",
+                [
+                    (address, data.get('name', address), data.get('chat_id'), data.get('added_at'))
+                    for address, data in wallets.items()
+                ]
+            )
+
+    def import_tracked_tokens(self, tracked_tokens: Dict):
+        """
+        Insert tracked tokens loaded from the legacy tracked_tokens.json file.
+        
+        Args:
+            tracked_tokens (Dict): Token details keyed by token address
+        """
+        with self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO tracked_tokens VALUES (?, ?, ?)",
+                [
+                    (token_address, json_dumps(data.get('wallets', [])).decode(), data.get('added_at'))
+                    for token_address, data in tracked_tokens.items()
+                ]
+            )
+
+    def create_schema(self):
+        """
+        Create the wallets, tracked_tokens and transactions tables and their
+        indexes if they don't exist.
+        """
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS wallets (
+                address TEXT PRIMARY KEY,
+                name TEXT,
+                chat_id INTEGER,
+                added_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS tracked_tokens (
+                token_address TEXT PRIMARY KEY,
+                wallets TEXT,
+                added_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS transactions (
+                signature TEXT PRIMARY KEY,
+                wallet_address TEXT,
+                token_address TEXT,
+                token_symbol TEXT,
+                amount REAL,
+                price REAL,
+                is_buy INTEGER,
+                is_sell INTEGER,
+                timestamp INTEGER,
+                block_timestamp TEXT,
+                transaction_type TEXT,
+                sub_category TEXT,
+                value_usd REAL,
+                signed_value_usd REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_transactions_wallet_ts ON transactions (wallet_address, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_transactions_token_ts ON transactions (token_address, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_transactions_ts ON transactions (timestamp);
+        """)
+
+    def insert_transactions(self, batch: List[Tuple[str, List[Dict]]]):
+        """
+        Insert transactions into the history database in a single database
+        transaction, ignoring known signatures, and invalidate cached summaries.
+        
+        Args:
+            batch (List[Tuple[str, List[Dict]]]): Pairs of token address and the transactions for that token
+        """
+        with self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        tx.get('signature'),
+                        tx.get('wallet_address'),
+                        token_address,
+                        tx.get('token_symbol'),
+                        tx.get('amount'),
+                        tx.get('price'),
+                        int(bool(tx.get('is_buy'))),
+                        int(bool(tx.get('is_sell'))),
+                        tx.get('timestamp'),
+                        tx.get('block_timestamp'),
+                        tx.get('transaction_type'),
+                        tx.get('sub_category'),
+                        tx.get('value_usd'),
+                        signed_value(tx.get('value_usd'), tx.get('is_buy'))
+                    )
+                    for token_address, transactions in batch
+                    for tx in transactions
+                ]
+            )
+        # New rows change the aggregates, so drop cached summaries
+        self.summary_cache.clear()
+
+    def has_stored_signature(self, token_address: str, transactions: List[Dict]) -> bool:
+        """
+        Check whether any of the given transactions is already in the history
+        database.
+        
+        Args:
+            token_address (str): The token address to check
+            transactions (List[Dict]): List of transactions to check
+            
+        Returns:
+            bool: True if at least one signature is already stored, False otherwise
+        """
+        signatures = [tx.get('signature') for tx in transactions]
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(signatures), 500):
+            chunk = signatures[i:i + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            row = self.db.execute(
+                f"SELECT 1 FROM transactions WHERE token_address = ? AND signature IN ({placeholders}) LIMIT 1",
+                (token_address, *chunk)
+            ).fetchone()
+            if row:
+                return True
+        return False
 
-    def add_wallet(self, address, name):
+    def add_wallet(self, address, name, chat_id=None):
         """
         Add a new wallet to track.
         
         Args:
             address (str): The wallet address to track
             name (str): A friendly name for the wallet
+            chat_id (int, optional): The Telegram chat that added the wallet and receives its alerts
             
-        Logs the addition and saves the updated data.
+        Logs the addition and saves the wallet to the database.
         """
         try:
-            # Create data directory if it doesn't exist
-            data_dir = Path("data")
-            data_dir.mkdir(exist_ok=True)
-            
-            # Create tracked_wallets.json if it doesn't exist
-            wallets_file = data_dir / "tracked_wallets.json"
-            if not wallets_file.exists():
-                wallets_file.write_text("{}")
-                logging.info("Created new tracked_wallets.json file")
-            
             wallet_logger.info(f"Adding wallet {name} ({address})")
+            added_at = datetime.now().isoformat()
+            with self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO wallets VALUES (?, ?, ?, ?)",
+                    (address, name, chat_id, added_at)
+                )
             self.wallets[address] = {
                 'name': name,
-                'added_at': datetime.now().isoformat()
+                'chat_id': chat_id,
+                'added_at': added_at
             }
-            self.save_data()
+            self.wallets_version += 1
             wallet_logger.info(f"Wallet {name} ({address}) added successfully")
         except Exception as e:
             wallet_logger.error(f"Error adding wallet {name} ({address}): {e}")
@@ -203,18 +527,52 @@ class WalletTracker:
         Returns:
             bool: True if wallet was removed, False if not found
             
-        Logs the removal and saves the updated data.
+        Logs the removal and deletes the wallet from the database.
         """
         wallet_logger.info(f"Attempting to remove wallet {address}")
         if address in self.wallets:
             wallet_name = self.wallets[address]['name']
+            with self.db:
+                self.db.execute("DELETE FROM wallets WHERE address = ?", (address,))
             del self.wallets[address]
-            self.save_data()
+            self.latest_swap_times.pop(address, None)
+            self.last_push_checks.pop(address, None)
+            self.wallets_version += 1
             wallet_logger.info(f"Wallet {wallet_name} ({address}) removed successfully")
             return True
         wallet_logger.warning(f"Wallet {address} not found")
         return False
 
+    def rename_wallet(self, address, name):
+        """
+        Change the friendly name of a tracked wallet.
+        
+        Args:
+            address (str): The wallet address
+            name (str): The new name
+        """
+        wallet_logger.info(f"Renaming wallet {address} to {name}")
+        with self.db:
+            self.db.execute("UPDATE wallets SET name = ? WHERE address = ?", (name, address))
+        self.wallets[address]['name'] = name
+        self.wallets_version += 1
+
+    def change_wallet_address(self, old_address, new_address):
+        """
+        Move a tracked wallet's details to a new address.
+        
+        Args:
+            old_address (str): The current wallet address
+            new_address (str): The address to move the wallet to
+        """
+        wallet_logger.info(f"Changing wallet address from {old_address} to {new_address}")
+        with self.db:
+            self.db.execute("UPDATE OR REPLACE wallets SET address = ? WHERE address = ?", (new_address, old_address))
+        self.wallets[new_address] = self.wallets.pop(old_address)
+        self.latest_swap_times.pop(old_address, None)
+        self.last_push_checks.pop(old_address, None)
+        self.wallets_version += 1
+
     def get_wallet_name(self, address):
         """
         Get the friendly name of a wallet.
@@ -225,11 +583,42 @@ class WalletTracker:
         Returns:
             str: The wallet's friendly name or address if name not found
         """
-        wallet_logger.debug(f"Getting name for wallet {address}")
+        wallet_logger.debug("Getting name for wallet %s", address)
         name = self.wallets.get(address, {}).get('name', address)
-        wallet_logger.debug(f"Wallet {address} name: {name}")
+        wallet_logger.debug("Wallet %s name: %s", address, name)
         return name
 
+    def claim_unowned_wallets(self, chat_id: int) -> int:
+        """
+        Link wallets that have no chat, i.e. ones imported from the legacy
+        JSON files, to the given chat so their alerts have somewhere to go.
+        
+        Args:
+            chat_id (int): The chat to link the wallets to
+            
+        Returns:
+            int: Number of wallets that were linked
+        """
+        if not self.has_unowned:
+            return 0
+        unowned = [address for address, data in self.wallets.items() if data.get('chat_id') is None]
+        self.has_unowned = False
+        with self.db:
+            self.db.execute("UPDATE wallets SET chat_id = ? WHERE chat_id IS NULL", (chat_id,))
+        for address in unowned:
+            self.wallets[address]['chat_id'] = chat_id
+        wallet_logger.info(f"Linked {len(unowned)} wallets without a chat to chat {chat_id}")
+        return len(unowned)
+
+    def get_alert_chat_ids(self):
+        """
+        Get the Telegram chats that should receive alerts.
+        
+        Returns:
+            list: Unique chat IDs of the chats that own tracked wallets
+        """
+        return list({data['chat_id'] for data in self.wallets.values() if data.get('chat_id') is not None})
+
     def add_tracked_token(self, token_address, wallets):
         """
         Add a new token to track for specified wallets.
@@ -238,14 +627,19 @@ class WalletTracker:
             token_address (str): The token address to track
             wallets (list): List of wallet addresses to track the token for
             
-        Logs the addition and saves the updated data.
+        Logs the addition and saves the token to the database.
         """
         token_logger.info(f"Adding tracked token {token_address} for {len(wallets)} wallets")
+        added_at = datetime.now().isoformat()
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO tracked_tokens VALUES (?, ?, ?)",
+                (token_address, json_dumps(wallets).decode(), added_at)
+            )
         self.tracked_tokens[token_address] = {
             'wallets': wallets,
-            'added_at': datetime.now().isoformat()
+            'added_at': added_at
         }
-        self.save_data()
         token_logger.info(f"Token {token_address} added successfully")
 
     def remove_tracked_token(self, token_address):
@@ -258,115 +652,81 @@ class WalletTracker:
         Returns:
             bool: True if token was removed, False if not found
             
-        Logs the removal and saves the updated data.
+        Logs the removal and deletes the token from the database.
         """
         token_logger.info(f"Attempting to remove tracked token {token_address}")
         if token_address in self.tracked_tokens:
+            with self.db:
+                self.db.execute("DELETE FROM tracked_tokens WHERE token_address = ?", (token_address,))
             del self.tracked_tokens[token_address]
-            self.save_data()
             token_logger.info(f"Token {token_address} removed successfully")
             return True
         token_logger.warning(f"Token {token_address} not found")
         return False
 
-    def detect_multi_buys(self, transactions: List[Dict]) -> Optional[Dict]:
+    def detect_multi_activity(self, transactions: List[Dict]) -> Tuple[Optional[Dict], Optional[Dict]]:
         """
-        Analyze transactions to detect multiple buys of the same token.
+        Analyze transactions to detect multiple buys and multiple sells of the
+        same token. Buys and sells are grouped by token in a single pass.
         
         Args:
             transactions (List[Dict]): List of transaction dictionaries
             
         Returns:
-            Optional[Dict]: Dictionary containing multi-buy information if detected, None otherwise
+            Tuple[Optional[Dict], Optional[Dict]]: Multi-buy and multi-sell
+            information if detected, None otherwise
             
         Logs the detection process and results.
         """
-        transaction_logger.info(f"Detecting multi-buys from {len(transactions)} transactions")
-        # Group transactions by token
-        token_buys = {}
+        transaction_logger.info(f"Detecting multi-buys and multi-sells from {len(transactions)} transactions")
+        # Group buys and sells by token
+        def new_group():
+            return {'wallets': set(), 'total_amount': 0.0, 'token_symbol': '', 'transactions': []}
+        token_buys = defaultdict(new_group)
+        token_sells = defaultdict(new_group)
+        # Parsed swaps are either a buy or a sell, so one lookup picks the side
+        groups_by_side = {True: token_buys, False: token_sells}
         
         for tx in transactions:
-            if not tx.get('is_buy'):
-                continue
-                
             token_address = tx.get('token_address')
             if not token_address:
                 continue
-                
-            if token_address not in token_buys:
-                token_buys[token_address] = {
-                    'wallets': set(),
-                    'total_amount': 0,
-                    'token_symbol': tx.get('token_symbol', ''),
-                    'transactions': []
-                }
             
-            token_buys[token_address]['wallets'].add(tx.get('wallet_address'))
-            token_buys[token_address]['total_amount'] += float(tx.get('amount', 0))
-            token_buys[token_address]['transactions'].append(tx)
+            group = groups_by_side[tx['is_buy']][token_address]
+            if not group['transactions']:
+                group['token_symbol'] = tx.get('token_symbol', '')
+            group['wallets'].add(tx.get('wallet_address'))
+            group['total_amount'] += tx['amount']
+            group['transactions'].append(tx)
         
-        # Check for multi-buys
-        for token_address, data in token_buys.items():
-            if len(data['wallets']) >= self.min_buys_for_alert:
-                transaction_logger.info(f"Found potential multi-buy for token {data['token_symbol']} ({token_address})")
-                # Check if this multi-buy was already alerted
-                if not self.is_multi_buy_already_alerted(token_address, data['transactions']):
-                    transaction_logger.info(f"New multi-buy detected: {len(data['wallets'])} wallets bought {data['token_symbol']}")
-                    return {
-                        'token_address': token_address,
-                        'token_symbol': data['token_symbol'],
-                        'wallet_count': len(data['wallets']),
-                        'total_amount': data['total_amount'],
-                        'transactions': data['transactions']
-                    }
-                else:
-                    transaction_logger.info(f"Multi-buy already alerted for token {data['token_symbol']}")
-        transaction_logger.info("No new multi-buys detected")
-        return None
+        multi_buy = self.find_new_multi_activity(
+            token_buys, self.min_buys_for_alert, self.is_multi_buy_already_alerted, 'buy', 'bought'
+        )
+        multi_sell = self.find_new_multi_activity(
+            token_sells, self.min_sells_for_alert, self.is_multi_sell_already_alerted, 'sell', 'sold'
+        )
+        return multi_buy, multi_sell
 
-    def detect_multi_sells(self, transactions: List[Dict]) -> Optional[Dict]:
+    def find_new_multi_activity(self, token_groups: Dict, min_wallets: int, already_alerted, kind: str, verb: str) -> Optional[Dict]:
         """
-        Analyze transactions to detect multiple sells of the same token.
+        Find the first token group with enough wallets that hasn't been alerted yet.
         
         Args:
-            transactions (List[Dict]): List of transaction dictionaries
+            token_groups (Dict): Buys or sells grouped by token address
+            min_wallets (int): Minimum number of distinct wallets required
+            already_alerted (Callable): is_multi_buy_already_alerted or is_multi_sell_already_alerted
+            kind (str): 'buy' or 'sell', used in log messages
+            verb (str): 'bought' or 'sold', used in log messages
             
         Returns:
-            Optional[Dict]: Dictionary containing multi-sell information if detected, None otherwise
-            
-        Logs the detection process and results.
+            Optional[Dict]: Dictionary containing multi-buy/sell information if detected, None otherwise
         """
-        transaction_logger.info(f"Detecting multi-sells from {len(transactions)} transactions")
-        # Group transactions by token
-        token_sells = {}
-        
-        for tx in transactions:
-            if not tx.get('is_sell'):
-                continue
-                
-            token_address = tx.get('token_address')
-            if not token_address:
-                continue
-                
-            if token_address not in token_sells:
-                token_sells[token_address] = {
-                    'wallets': set(),
-                    'total_amount': 0,
-                    'token_symbol': tx.get('token_symbol', ''),
-                    'transactions': []
-                }
-            
-            token_sells[token_address]['wallets'].add(tx.get('wallet_address'))
-            token_sells[token_address]['total_amount'] += float(tx.get('amount', 0))
-            token_sells[token_address]['transactions'].append(tx)
-        
-        # Check for multi-sells
-        for token_address, data in token_sells.items():
-            if len(data['wallets']) >= self.min_sells_for_alert:
-                transaction_logger.info(f"Found potential multi-sell for token {data['token_symbol']} ({token_address})")
-                # Check if this multi-sell was already alerted
-                if not self.is_multi_sell_already_alerted(token_address, data['transactions']):
-                    transaction_logger.info(f"New multi-sell detected: {len(data['wallets'])} wallets sold {data['token_symbol']}")
+        for token_address, data in token_groups.items():
+            if len(data['wallets']) >= min_wallets:
+                transaction_logger.info(f"Found potential multi-{kind} for token {data['token_symbol']} ({token_address})")
+                # Check if this multi-buy/sell was already alerted
+                if not already_alerted(token_address, data['transactions']):
+                    transaction_logger.info(f"New multi-{kind} detected: {len(data['wallets'])} wallets {verb} {data['token_symbol']}")
                     return {
                         'token_address': token_address,
                         'token_symbol': data['token_symbol'],
@@ -375,8 +735,8 @@ class WalletTracker:
                         'transactions': data['transactions']
                     }
                 else:
-                    transaction_logger.info(f"Multi-sell already alerted for token {data['token_symbol']}")
-        transaction_logger.info("No new multi-sells detected")
+                    transaction_logger.info(f"Multi-{kind} already alerted for token {data['token_symbol']}")
+        transaction_logger.info(f"No new multi-{kind}s detected")
         return None
 
     def is_multi_buy_already_alerted(self, token_address: str, transactions: List[Dict]) -> bool:
@@ -392,21 +752,13 @@ class WalletTracker:
             
         Logs the checking process and results.
         """
-        transaction_logger.debug(f"Checking if multi-buy for token {token_address} was already alerted")
-        if token_address not in self.transactions:
-            transaction_logger.debug(f"No previous transactions found for token {token_address}")
-            return False
-            
-        # Get the signatures of the current transactions
-        current_signatures = {tx.get('signature') for tx in transactions}
-        
+        transaction_logger.debug("Checking if multi-buy for token %s was already alerted", token_address)
         # Check if any of these transactions were already stored
-        for stored_tx in self.transactions[token_address]:
-            if stored_tx.get('signature') in current_signatures:
-                transaction_logger.debug(f"Found matching signature for token {token_address}")
-                return True
+        if self.has_stored_signature(token_address, transactions):
+            transaction_logger.debug("Found matching signature for token %s", token_address)
+            return True
                 
-        transaction_logger.debug(f"No matching signatures found for token {token_address}")
+        transaction_logger.debug("No matching signatures found for token %s", token_address)
         return False
 
     def is_multi_sell_already_alerted(self, token_address: str, transactions: List[Dict]) -> bool:
@@ -422,21 +774,13 @@ class WalletTracker:
             
         Logs the checking process and results.
         """
-        transaction_logger.debug(f"Checking if multi-sell for token {token_address} was already alerted")
-        if token_address not in self.transactions:
-            transaction_logger.debug(f"No previous transactions found for token {token_address}")
-            return False
-            
-        # Get the signatures of the current transactions
-        current_signatures = {tx.get('signature') for tx in transactions}
-        
+        transaction_logger.debug("Checking if multi-sell for token %s was already alerted", token_address)
         # Check if any of these transactions were already stored
-        for stored_tx in self.transactions[token_address]:
-            if stored_tx.get('signature') in current_signatures:
-                transaction_logger.debug(f"Found matching signature for token {token_address}")
-                return True
+        if self.has_stored_signature(token_address, transactions):
+            transaction_logger.debug("Found matching signature for token %s", token_address)
+            return True
                 
-        transaction_logger.debug(f"No matching signatures found for token {token_address}")
+        transaction_logger.debug("No matching signatures found for token %s", token_address)
         return False
 
     def store_multi_buy(self, token_address: str, transactions: List[Dict]):
@@ -447,15 +791,10 @@ class WalletTracker:
             token_address (str): The token address
             transactions (List[Dict]): List of transactions to store
             
-        Logs the storage process and saves the updated data.
+        Logs the storage process.
         """
         transaction_logger.info(f"Storing multi-buy for token {token_address}")
-        if token_address not in self.transactions:
-            self.transactions[token_address] = []
-            
-        # Add new transactions
-        self.transactions[token_address].extend(transactions)
-        self.save_data()
+        self.insert_transactions([(token_address, transactions)])
         transaction_logger.info(f"Stored {len(transactions)} transactions for token {token_address}")
 
     def store_multi_sell(self, token_address: str, transactions: List[Dict]):
@@ -466,17 +805,147 @@ class WalletTracker:
             token_address (str): The token address
             transactions (List[Dict]): List of transactions to store
             
-        Logs the storage process and saves the updated data.
+        Logs the storage process.
         """
         transaction_logger.info(f"Storing multi-sell for token {token_address}")
-        if token_address not in self.transactions:
-            self.transactions[token_address] = []
-            
-        # Add new transactions
-        self.transactions[token_address].extend(transactions)
-        self.save_data()
+        self.insert_transactions([(token_address, transactions)])
         transaction_logger.info(f"Stored {len(transactions)} transactions for token {token_address}")
 
+    def get_activity_summary(self, hours: int = 24) -> Dict:
+        """
+        Summarize alerted transaction activity over a recent time window.
+        Aggregation runs as GROUP BY queries inside SQLite.
+        
+        Args:
+            hours (int): Size of the time window in hours
+            
+        Returns:
+            Dict: 'tokens' with the top 10 tokens by USD volume and 'wallets'
+            with the 10 wallets with the largest USD net flow (sells minus
+            buys) in either direction and their transaction counts
+        """
+        # Serve bursts of /summary requests from a short-lived cache
+        now = time.time()
+        cached = self.summary_cache.get(hours)
+        if cached and now - cached[0] < SUMMARY_CACHE_TTL:
+            return cached[1]
+        
+        cutoff_time = int(now) - hours * 3600
+        tokens = self.db.execute(
+            """
+            SELECT token_address, MAX(token_symbol), TOTAL(value_usd) AS volume,
+                   COUNT(*), COUNT(DISTINCT wallet_address)
+            FROM transactions
+            WHERE timestamp >= ?
+            GROUP BY token_address
+            ORDER BY volume DESC
+            LIMIT 10
+            """,
+            (cutoff_time,)
+        ).fetchall()
+        wallets = self.db.execute(
+            """
+            SELECT wallet_address, TOTAL(signed_value_usd) AS net, COUNT(*)
+            FROM transactions
+            WHERE timestamp >= ?
+            GROUP BY wallet_address
+            ORDER BY ABS(net) DESC
+            LIMIT 10
+            """,
+            (cutoff_time,)
+        ).fetchall()
+        summary = {
+            'tokens': [
+                {'token_address': row[0], 'token_symbol': row[1], 'volume': row[2], 'tx_count': row[3], 'wallet_count': row[4]}
+                for row in tokens
+            ],
+            'wallets': [
+                {'wallet_address': row[0], 'net_flow': row[1], 'tx_count': row[2]}
+                for row in wallets
+            ]
+        }
+        self.summary_cache[hours] = (now, summary)
+        return summary
+
+    def prune_transactions(self, cutoff_time: int) -> int:
+        """
+        Delete stored transactions older than the retention window so the
+        history database stays bounded on long-running bots.
+        
+        Args:
+            cutoff_time (int): Epoch seconds; transactions before this are deleted
+            
+        Returns:
+            int: Number of deleted transactions
+        """
+        with self.db:
+            deleted = self.db.execute("DELETE FROM transactions WHERE timestamp < ?", (cutoff_time,)).rowcount
+        self.summary_cache.clear()
+        return deleted
+
+    def prune_parsed_swaps(self, cutoff_time: int):
+        """
+        Drop cached parsed swaps older than the detection window, along with
+        latest swap times that no longer have cached swaps behind them, so
+        those wallets go back to fetching the full window.
+        
+        Args:
+            cutoff_time (int): Epoch seconds; swaps before this are dropped
+        """
+        self.parsed_swaps = {
+            signature: tx for signature, tx in self.parsed_swaps.items()
+            if tx['timestamp'] >= cutoff_time
+        }
+        self.latest_swap_times = {
+            wallet_address: latest for wallet_address, latest in self.latest_swap_times.items()
+            if latest >= cutoff_time
+        }
+
+    def cache_parsed_swaps(self, transactions: List[Dict]) -> List[Dict]:
+        """
+        Merge freshly parsed swaps into the parsed swaps cache, reusing the
+        cached entry for swaps seen on a previous check, and advance each
+        wallet's latest swap time only once its swaps are cached. Must be
+        called on the event loop thread, after parse_swaps_response returns.
+        
+        Args:
+            transactions (List[Dict]): Swaps returned by parse_swaps_response
+            
+        Returns:
+            List[Dict]: The swaps, with already cached ones replaced by their cached entry
+        """
+        merged = []
+        for tx in transactions:
+            signature = tx['signature']
+            cached = self.parsed_swaps.get(signature)
+            if cached is not None:
+                merged.append(cached)
+                continue
+            
+            # Log transaction details
+            transaction_logger.info(
+                f"Transaction Details:\n"
+                f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+                f"👤 Wallet Name: {self.get_wallet_name(tx['wallet_address'])}\n"
+                f"🔑 Wallet Address: {tx['wallet_address']}\n"
+                f"📝 Transaction Type: {tx['transaction_type']}\n"
+                f"🏷️ Sub Category: {tx['sub_category']}\n"
+                f"🔗 Pair Address: {tx['token_address']}\n"
+                f"💎 Token Symbol: {tx['token_symbol']}\n"
+                f"💰 Amount: {tx['amount']:.4f} SOL\n"
+                f"🕒 Timestamp: {datetime.fromtimestamp(tx['timestamp'], tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')}\n"
+                f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
+            )
+            
+            self.parsed_swaps[signature] = tx
+            merged.append(tx)
+        
+        for tx in merged:
+            wallet_address = tx['wallet_address']
+            if tx['timestamp'] > self.latest_swap_times.get(wallet_address, 0):
+                self.latest_swap_times[wallet_address] = tx['timestamp']
+        return merged
+
     def can_call_api(self, wallet_address: str) -> bool:
         """
         Check if we can make an API call for a specific wallet.
@@ -487,15 +956,13 @@ class WalletTracker:
         Returns:
             bool: True if we can make an API call, False if we need to wait
         """
-        current_time = datetime.now()
         last_call = self.last_api_calls.get(wallet_address)
         
         if last_call is None:
             return True
             
         # Check if at least 60 seconds have passed since last call
-        time_diff = (current_time - last_call).total_seconds()
-        return time_diff >= 60
+        return time.monotonic() - last_call >= 60
 
     def update_last_api_call(self, wallet_address: str):
         """
@@ -504,16 +971,116 @@ class WalletTracker:
         Args:
             wallet_address (str): The wallet address to update
         """
-        self.last_api_calls[wallet_address] = datetime.now()
+        self.last_api_calls[wallet_address] = time.monotonic()
 
 # Initialize wallet tracker
 wallet_tracker = WalletTracker()
 
-async def get_recent_transactions(wallet_address: str) -> List[Dict]:
+def parse_swaps_response(response_text: str, wallet_address: str) -> List[Dict]:
+    """
+    Decode a Moralis swaps response and transform it into transaction dictionaries.
+    Pure CPU work, run in an executor so it doesn't block the event loop; it
+    must not touch wallet_tracker, which is only used from the loop thread.
+    
+    Args:
+        response_text (str): The raw response body
+        wallet_address (str): The wallet address the swaps were fetched for
+        
+    Returns:
+        List[Dict]: List of buy/sell transaction dictionaries
+    """
+    try:
+        data = json_loads(response_text)
+    except json.JSONDecodeError as e:
+        logging.error(f"Failed to parse API response: {e}")
+        return []
+        
+    if not isinstance(data, dict):
+        logging.error(f"Unexpected response format: {data}")
+        return []
+        
+    # Get the result array from the response
+    transactions_data = data.get('result', [])
+    if not isinstance(transactions_data, list):
+        logging.error(f"Unexpected result format: {transactions_data}")
+        return []
+        
+    logging.info(f"Found {len(transactions_data)} transactions for wallet {wallet_address}")
+    
+    # Transform Moralis data to our format
+    transactions = []
+    for tx in transactions_data:
+        if not isinstance(tx, dict):
+            continue
+            
+        try:
+            # Get transaction subcategory and skip swaps we don't track
+            sub_category = tx.get('subCategory', '')
+            if sub_category not in TRACKED_SUB_CATEGORIES:
+                continue
+            
+            # Swaps without a signature can't be cached or deduplicated
+            signature = tx.get('signature', '')
+            if not signature:
+                logging.warning(f"Skipping swap without a signature for wallet {wallet_address}")
+                continue
+            tx_type = tx.get('transactionType', '')
+            
+            # Get wallet and token addresses
+            tx_wallet_address = tx.get('walletAddress', '')
+            pair_address = tx.get('pairAddress', '')
+            
+            # Determine if it's a buy or sell
+            is_buy = sub_category == BUY_SUB_CATEGORY
+            is_sell = not is_buy
+            
+            # Buys report the token on the bought side, sells on the sold side
+            side = tx.get('bought' if is_buy else 'sold') or {}
+            token_symbol = side.get('symbol', '')
+            amount = float(side.get('amount', 0))
+            # The amount is in the token's own units, so flows are totalled in USD
+            value_usd = tx.get('totalValueUsd')
+            value_usd = float(value_usd) if value_usd is not None else None
+            
+            # Parse ISO 8601 timestamp
+            timestamp_str = tx.get('blockTimestamp', '')
+            try:
+                # Convert ISO 8601 to datetime
+                dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+                timestamp = int(dt.timestamp())
+            except (ValueError, TypeError) as e:
+                logging.error("Error parsing timestamp %s: %s", timestamp_str, e)
+                continue
+            
+            transaction_data = {
+                'wallet_address': tx_wallet_address,
+                'token_address': pair_address,
+                'token_symbol': token_symbol,
+                'amount': amount,
+                'is_buy': is_buy,
+                'is_sell': is_sell,
+                'timestamp': timestamp,
+                'block_timestamp': timestamp_str,  # Store the original blockTimestamp
+                'signature': signature,
+                'price': float(tx.get('price', 0)),
+                'value_usd': value_usd,
+                'transaction_type': tx_type,
+                'sub_category': sub_category
+            }
+            transactions.append(transaction_data)
+        except (ValueError, TypeError) as e:
+            logging.error("Error processing transaction: %s", e)
+            continue
+            
+    logging.info(f"Successfully processed {len(transactions)} transactions for wallet {wallet_address}")
+    return transactions
+
+async def get_recent_transactions(session: aiohttp.ClientSession, wallet_address: str) -> List[Dict]:
     """
     Fetch recent transactions for a wallet using the Moralis API.
     
     Args:
+        session (aiohttp.ClientSession): The shared HTTP session to send the request on
         wallet_address (str): The wallet address to fetch transactions for
         
     Returns:
@@ -531,559 +1098,705 @@ async def get_recent_transactions(wallet_address: str) -> List[Dict]:
         # Update the endpoint to use the correct path
         url = f"{MORALIS_API_URL}/{wallet_address}/swaps"
         
-        # Add query parameters
+        # Add query parameters, only asking for swaps inside the alert window
+        # that are not older than the newest one already fetched for this wallet
+        window_start = time.time() - ALERT_WINDOW_HOURS * 3600
+        from_date = datetime.fromtimestamp(
+            max(window_start, wallet_tracker.latest_swap_times.get(wallet_address, 0)),
+            tz=timezone.utc
+        )
         params = {
             "order": "DESC",
-            "limit": 100  # Limit the number of transactions to avoid overwhelming the API
+            "limit": 100,  # Limit the number of transactions to avoid overwhelming the API
+            "fromDate": from_date.isoformat()
         }
         
         logging.info(f"Making API request for wallet {wallet_address}")
-        logging.debug(f"Request URL: {url}")
-        logging.debug(f"Request params: {params}")
+        logging.debug("Request URL: %s", url)
+        logging.debug("Request params: %s", params)
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, params=params) as response:
-                response_text = await response.text()
-                logging.info(f"API Response status: {response.status}")
-                logging.debug(f"API Response headers: {response.headers}")
-                logging.debug(f"API Response body: {response_text[:1000]}...")  # Log first 1000 chars of response
-                
-                if response.status == 200:
-                    try:
-                        data = json.loads(response_text)
-                    except json.JSONDecodeError as e:
-                        logging.error(f"Failed to parse API response: {e}")
-                        return []
-                        
-                    if not isinstance(data, dict):
-                        logging.error(f"Unexpected response format: {data}")
-                        return []
-                        
-                    # Get the result array from the response
-                    transactions_data = data.get('result', [])
-                    if not isinstance(transactions_data, list):
-                        logging.error(f"Unexpected result format: {transactions_data}")
-                        return []
-                        
-                    logging.info(f"Found {len(transactions_data)} transactions for wallet {wallet_address}")
-                    
-                    # Transform Moralis data to our format
-                    transactions = []
-                    for tx in transactions_data:
-                        if not isinstance(tx, dict):
-                            continue
-                            
-                        try:
-                            # Get transaction type and subcategory
-                            tx_type = tx.get('transactionType', '')
-                            sub_category = tx.get('subCategory', '')
-                            
-                            # Get wallet and token addresses
-                            wallet_address = tx.get('walletAddress', '')
-                            pair_address = tx.get('pairAddress', '')
-                            
-                            # Get transaction details
-                            bought = tx.get('bought', {})
-                            sold = tx.get('sold', {})
-                            
-                            # Determine if it's a buy or sell
-                            is_buy = sub_category == 'newPosition'
-                            is_sell = sub_category == 'sellAll'
-                            
-                            # Only include transactions we want to track
-                            if is_buy or is_sell:
-                                # Get the correct token symbol and amount based on transaction type
-                                token_symbol = bought.get('symbol', '') if is_buy else sold.get('symbol', '')
-                                amount = float(bought.get('amount', 0)) if is_buy else float(sold.get('amount', 0))
-                                
-                                # Parse ISO 8601 timestamp
-                                timestamp_str = tx.get('blockTimestamp', '')
-                                try:
-                                    # Convert ISO 8601 to datetime
-                                    dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                                    timestamp = int(dt.timestamp())
-                                except (ValueError, TypeError) as e:
-                                    logging.error(f"Error parsing timestamp {timestamp_str}: {e}")
-                                    continue
-                                
-                                # Log transaction details
-                                transaction_logger.info(
-                                    f"Transaction Details:\n"
-                                    f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                                    f"👤 Wallet Name: {wallet_tracker.get_wallet_name(wallet_address)}\n"
-                                    f"🔑 Wallet Address: {wallet_address}\n"
-                                    f"📝 Transaction Type: {tx_type}\n"
-                                    f"🏷️ Sub Category: {sub_category}\n"
-                                    f"🔗 Pair Address: {pair_address}\n"
-                                    f"💎 Token Symbol: {token_symbol}\n"
-                                    f"💰 Amount: {amount:.4f} SOL\n"
-                                    f"🕒 Timestamp: {dt.strftime('%Y-%m-%d %H:%M:%S')}\n"
-                                    f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
-                                )
-                                
-                                transaction_data = {
-                                    'wallet_address': wallet_address,
-                                    'token_address': pair_address,
-                                    'token_symbol': token_symbol,
-                                    'amount': amount,
-                                    'is_buy': is_buy,
-                                    'is_sell': is_sell,
-                                    'timestamp': timestamp,
-                                    'block_timestamp': timestamp_str,  # Store the original blockTimestamp
-                                    'signature': tx.get('signature', ''),
-                                    'price': float(tx.get('price', 0)),
-                                    'transaction_type': tx_type,
-                                    'sub_category': sub_category
-                                }
-                                transactions.append(transaction_data)
-                        except (ValueError, TypeError) as e:
-                            logging.error(f"Error processing transaction: {e}")
-                            continue
-                            
-                    logging.info(f"Successfully processed {len(transactions)} transactions for wallet {wallet_address}")
-                    return transactions
-                else:
-                    logging.error(f"API request failed with status {response.status}")
-                    logging.error(f"Response: {response_text}")
-                    return []
+        async with session.get(url, headers=headers, params=params) as response:
+            response_text = await response.text()
+            logging.info(f"API Response status: {response.status}")
+            logging.debug("API Response headers: %s", response.headers)
+            logging.debug("API Response body: %.1000s...", response_text)  # Log first 1000 chars of response
+            
+            if response.status == 200:
+                # Decode and transform off the event loop
+                loop = asyncio.get_running_loop()
+                transactions = await loop.run_in_executor(None, parse_swaps_response, response_text, wallet_address)
+                return wallet_tracker.cache_parsed_swaps(transactions)
+            else:
+                logging.error(f"API request failed with status {response.status}")
+                logging.error(f"Response: {response_text}")
+                return []
     except Exception as e:
         logging.error(f"Error in get_recent_transactions: {e}", exc_info=True)
         return []
 
-async def check_transactions():
+async def check_transactions(context: CallbackContext):
     """
-    Continuously check for recent transactions and detect multi-buys/sells.
-    Runs in a loop with a 60-second delay between checks.
+    Check for recent transactions and detect multi-buys/sells.
+    Scheduled on the application's job queue, and triggered immediately by
+    log notifications when SOLANA_WS_URL is set. Push-triggered jobs carry
+    the set of notified wallets as their data and only fetch those.
     Logs detailed information about transactions and alerts.
     """
-    while True:
-        if not wallet_tracker.alerts_enabled:
-            logging.info("Alerts are disabled, skipping transaction check")
-            await asyncio.sleep(60)
-            continue
+    if not wallet_tracker.alerts_enabled:
+        logging.info("Alerts are disabled, skipping transaction check")
+        return
 
-        try:
-            # Skip if no wallets are being tracked
-            if not wallet_tracker.wallets:
-                logging.info("No wallets are being tracked, skipping transaction check")
-                await asyncio.sleep(60)
-                continue
+    try:
+        # Skip if no wallets are being tracked
+        if not wallet_tracker.wallets:
+            logging.info("No wallets are being tracked, skipping transaction check")
+            return
 
-            logging.info("Starting transaction check")
-            # Get transactions for all wallets
-            all_transactions = []
-            for address in wallet_tracker.wallets:
-                # Check if we can make an API call for this wallet
-                if not wallet_tracker.can_call_api(address):
-                    logging.info(f"Skipping API call for wallet {address} - too soon since last call")
-                    continue
-                    
+        # Push-triggered checks only fetch the notified wallets and skip the
+        # per-wallet spacing, which exists to pace the periodic poll
+        push_addresses = context.job.data if context.job else None
+        if push_addresses:
+            addresses = [address for address in push_addresses if address in wallet_tracker.wallets]
+        else:
+            addresses = list(wallet_tracker.wallets)
+
+        logging.info(f"Starting transaction check for {len(addresses)} wallets")
+        # Get transactions for the wallets concurrently, capped by a semaphore
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+        async def fetch_wallet(address):
+            # Check if we can make an API call for this wallet
+            if not push_addresses and not wallet_tracker.can_call_api(address):
+                logging.info(f"Skipping API call for wallet {address} - too soon since last call")
+                return []
+                
+            async with semaphore:
+                await context.bot_data['rate_limiter'].acquire()
                 logging.info(f"Checking transactions for wallet {address}")
-                transactions = await get_recent_transactions(address)
-                if transactions:  # Only update timestamp if we got transactions
-                    wallet_tracker.update_last_api_call(address)
-                all_transactions.extend(transactions)
-            
-            # If no transactions were fetched (all wallets were skipped), wait before next check
-            if not all_transactions:
-                logging.info("No transactions fetched in this cycle, waiting before next check")
-                await asyncio.sleep(60)
+                transactions = await get_recent_transactions(context.bot_data['http_session'], address)
+            if transactions:  # Only update timestamp if we got transactions
+                wallet_tracker.update_last_api_call(address)
+            return transactions
+
+        results = await asyncio.gather(
+            *(fetch_wallet(address) for address in addresses),
+            return_exceptions=True
+        )
+        new_transactions = 0
+        for result in results:
+            if isinstance(result, Exception):
+                logging.error("Error fetching wallet transactions: %s", result)
                 continue
-                
-            logging.info(f"Total transactions found: {len(all_transactions)}")
+            new_transactions += len(result)
+        
+        # If no transactions were fetched (all wallets were skipped), wait before next check
+        if not new_transactions:
+            logging.info("No transactions fetched in this cycle, waiting before next check")
+            return
             
-            # Filter transactions from the last 6 hours
-            cutoff_time = int((datetime.now() - timedelta(hours=6)).timestamp())
-            recent_transactions = [
-                tx for tx in all_transactions 
-                if tx.get('timestamp', 0) >= cutoff_time
-            ]
+        logging.info(f"Total transactions fetched: {new_transactions}")
+        
+        # Fetches only return swaps newer than the previous check, so the alert
+        # window is taken from the parsed swap cache
+        cutoff_time = int(time.time()) - ALERT_WINDOW_HOURS * 3600
+        wallet_tracker.prune_parsed_swaps(cutoff_time)
+        recent_transactions = [
+            tx for tx in list(wallet_tracker.parsed_swaps.values())
+            if tx['wallet_address'] in wallet_tracker.wallets
+        ]
+        
+        # Enhanced logging for recent transactions
+        logging.info(f"Recent transactions (last {ALERT_WINDOW_HOURS} hours): {len(recent_transactions)}")
+        if recent_transactions:
+            # Group transactions by type (buy/sell)
+            buys = [tx for tx in recent_transactions if tx.get('is_buy')]
+            sells = [tx for tx in recent_transactions if tx.get('is_sell')]
             
-            # Enhanced logging for recent transactions
-            logging.info(f"Recent transactions (last 6 hours): {len(recent_transactions)}")
-            if recent_transactions:
-                # Group transactions by type (buy/sell)
-                buys = [tx for tx in recent_transactions if tx.get('is_buy')]
-                sells = [tx for tx in recent_transactions if tx.get('is_sell')]
-                
-                # Group transactions by token
-                token_transactions = {}
-                for tx in recent_transactions:
-                    token = tx.get('token_symbol', 'Unknown')
-                    if token not in token_transactions:
-                        token_transactions[token] = {'buys': 0, 'sells': 0, 'total_buy_amount': 0, 'total_sell_amount': 0}
-                    if tx.get('is_buy'):
-                        token_transactions[token]['buys'] += 1
-                        token_transactions[token]['total_buy_amount'] += tx.get('amount', 0)
-                    else:
-                        token_transactions[token]['sells'] += 1
-                        token_transactions[token]['total_sell_amount'] += tx.get('amount', 0)
-                
-                # Log detailed transaction summary
-                logging.info("Transaction Summary:")
-                logging.info(f"- Total Buys: {len(buys)}")
-                logging.info(f"- Total Sells: {len(sells)}")
-                logging.info("\nPer Token Summary:")
-                for token, data in token_transactions.items():
-                    logging.info(f"\nToken: {token}")
-                    logging.info(f"- Buys: {data['buys']}")
-                    logging.info(f"- Sells: {data['sells']}")
-                    logging.info(f"- Total Buy Amount: {data['total_buy_amount']:.2f} SOL")
-                    logging.info(f"- Total Sell Amount: {data['total_sell_amount']:.2f} SOL")
-                
-                # Log unique wallets involved
-                unique_wallets = set(tx.get('wallet_address') for tx in recent_transactions)
-                logging.info(f"\nUnique Wallets Involved: {len(unique_wallets)}")
-                
-                # Log transaction timestamps
-                timestamps = [tx.get('timestamp', 0) for tx in recent_transactions]
-                if timestamps:
-                    latest = max(timestamps)
-                    earliest = min(timestamps)
-                    latest_time = datetime.fromtimestamp(latest).strftime('%Y-%m-%d %H:%M:%S')
-                    earliest_time = datetime.fromtimestamp(earliest).strftime('%Y-%m-%d %H:%M:%S')
-                    logging.info(f"\nTime Range:")
-                    logging.info(f"- Latest Transaction: {latest_time}")
-                    logging.info(f"- Earliest Transaction: {earliest_time}")
-            else:
-                logging.info("No recent transactions found in the last 6 hours")
+            # Group transactions by token
+            token_transactions = {}
+            for tx in recent_transactions:
+                token = tx.get('token_symbol', 'Unknown')
+                if token not in token_transactions:
+                    token_transactions[token] = {'buys': 0, 'sells': 0, 'total_buy_amount': 0, 'total_sell_amount': 0}
+                if tx.get('is_buy'):
+                    token_transactions[token]['buys'] += 1
+                    token_transactions[token]['total_buy_amount'] += tx.get('amount', 0)
+                else:
+                    token_transactions[token]['sells'] += 1
+                    token_transactions[token]['total_sell_amount'] += tx.get('amount', 0)
             
-            # Detect multi-buys
-            multi_buy = wallet_tracker.detect_multi_buys(recent_transactions)
-            if multi_buy:
-                logging.info(f"Multi-buy detected for token {multi_buy['token_symbol']}")
-                # Store the multi-buy
-                wallet_tracker.store_multi_buy(
-                    multi_buy['token_address'],
-                    multi_buy['transactions']
-                )
-                
-                # Format and send alert
-                message = f"🟢 Multi Buy Alert!\n\n"
-                message += f"{multi_buy['wallet_count']} wallets bought {multi_buy['token_symbol']} in the last 6 hours!\n"
-                message += f"Total: {multi_buy['total_amount']:.2f} SOL\n\n"
-                message += f"{multi_buy['token_address']}"
-                
-                # Send to all tracked wallets
-                for wallet in wallet_tracker.wallets:
-                    try:
-                        await context.bot.send_message(
-                            chat_id=wallet,
-                            text=message
-                        )
-                        logging.info(f"Sent multi-buy alert to wallet {wallet}")
-                    except Exception as e:
-                        logging.error(f"Error sending notification to {wallet}: {e}")
-
-            # Detect multi-sells
-            multi_sell = wallet_tracker.detect_multi_sells(recent_transactions)
-            if multi_sell:
-                logging.info(f"Multi-sell detected for token {multi_sell['token_symbol']}")
-                # Store the multi-sell
-                wallet_tracker.store_multi_sell(
-                    multi_sell['token_address'],
-                    multi_sell['transactions']
-                )
-                
-                # Format and send alert
-                message = f"🔴 Multi Sell Alert!\n\n"
-                message += f"{multi_sell['wallet_count']} wallets sold {multi_sell['token_symbol']} in the last 6 hours!\n"
-                message += f"Total: {multi_sell['total_amount']:.2f} SOL\n\n"
-                message += f"{multi_sell['token_address']}"
-                
-                # Send to all tracked wallets
-                for wallet in wallet_tracker.wallets:
+            # Log detailed transaction summary
+            logging.info("Transaction Summary:")
+            logging.info(f"- Total Buys: {len(buys)}")
+            logging.info(f"- Total Sells: {len(sells)}")
+            logging.info("\nPer Token Summary:")
+            for token, data in token_transactions.items():
+                logging.info(f"\nToken: {token}")
+                logging.info(f"- Buys: {data['buys']}")
+                logging.info(f"- Sells: {data['sells']}")
+                logging.info(f"- Total Buy Amount: {data['total_buy_amount']:.2f} SOL")
+                logging.info(f"- Total Sell Amount: {data['total_sell_amount']:.2f} SOL")
+            
+            # Log unique wallets involved
+            unique_wallets = set(tx.get('wallet_address') for tx in recent_transactions)
+            logging.info(f"\nUnique Wallets Involved: {len(unique_wallets)}")
+            
+            # Log transaction timestamps
+            timestamps = [tx.get('timestamp', 0) for tx in recent_transactions]
+            if timestamps:
+                latest = max(timestamps)
+                earliest = min(timestamps)
+                latest_time = datetime.fromtimestamp(latest).strftime('%Y-%m-%d %H:%M:%S')
+                earliest_time = datetime.fromtimestamp(earliest).strftime('%Y-%m-%d %H:%M:%S')
+                logging.info(f"\nTime Range:")
+                logging.info(f"- Latest Transaction: {latest_time}")
+                logging.info(f"- Earliest Transaction: {earliest_time}")
+        else:
+            logging.info(f"No recent transactions found in the last {ALERT_WINDOW_HOURS} hours")
+        
+        # Detect multi-buys and multi-sells in one pass
+        multi_buy, multi_sell = wallet_tracker.detect_multi_activity(recent_transactions)
+        if multi_buy:
+            logging.info(f"Multi-buy detected for token {multi_buy['token_symbol']}")
+            # Store the multi-buy
+            wallet_tracker.store_multi_buy(
+                multi_buy['token_address'],
+                multi_buy['transactions']
+            )
+            
+            # Format and send alert
+            message = f"🟢 Multi Buy Alert!\n\n"
+            message += f"{multi_buy['wallet_count']} wallets bought {multi_buy['token_symbol']} in the last {ALERT_WINDOW_HOURS} hours!\n"
+            message += f"Total: {multi_buy['total_amount']:.2f} SOL\n\n"
+            message += f"{multi_buy['token_address']}"
+            
+            # Hand off to the notifier so sending doesn't block detection
+            await context.bot_data['alert_queue'].put(message)
+
+        if multi_sell:
+            logging.info(f"Multi-sell detected for token {multi_sell['token_symbol']}")
+            # Store the multi-sell
+            wallet_tracker.store_multi_sell(
+                multi_sell['token_address'],
+                multi_sell['transactions']
+            )
+            
+            # Format and send alert
+            message = f"🔴 Multi Sell Alert!\n\n"
+            message += f"{multi_sell['wallet_count']} wallets sold {multi_sell['token_symbol']} in the last {ALERT_WINDOW_HOURS} hours!\n"
+            message += f"Total: {multi_sell['total_amount']:.2f} SOL\n\n"
+            message += f"{multi_sell['token_address']}"
+            
+            # Hand off to the notifier so sending doesn't block detection
+            await context.bot_data['alert_queue'].put(message)
+                    
+    except Exception as e:
+        logging.error(f"Error checking transactions: {e}", exc_info=True)
+
+async def prune_history(context: CallbackContext):
+    """
+    Job callback that deletes transactions older than TRANSACTION_RETENTION_DAYS.
+    """
+    try:
+        cutoff_time = int(time.time()) - TRANSACTION_RETENTION_DAYS * 86400
+        deleted = wallet_tracker.prune_transactions(cutoff_time)
+        transaction_logger.info(f"Pruned {deleted} transactions older than {TRANSACTION_RETENTION_DAYS} days")
+    except Exception as e:
+        transaction_logger.error(f"Error pruning transaction history: {e}")
+
+async def send_alert(bot, semaphore: asyncio.Semaphore, chat_id: int, message: str):
+    """
+    Send one alert message, retrying once after Telegram's flood control delay.
+    
+    Args:
+        bot: The telegram Bot to send with
+        semaphore (asyncio.Semaphore): Caps how many sends are in flight
+        chat_id (int): The chat to send the alert to
+        message (str): The alert text
+    """
+    async with semaphore:
+        try:
+            return await bot.send_message(chat_id=chat_id, text=message)
+        except RetryAfter as e:
+            logging.warning("Flood control for chat %s, retrying in %s seconds", chat_id, e.retry_after)
+            await asyncio.sleep(e.retry_after)
+            return await bot.send_message(chat_id=chat_id, text=message)
+
+async def send_alerts(application):
+    """
+    Consume alert messages from the queue and send each one to every chat
+    that tracks a wallet, overlapping the Telegram requests with gather.
+    At most MAX_CONCURRENT_SENDS requests are in flight at once.
+    """
+    queue = application.bot_data['alert_queue']
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SENDS)
+    while True:
+        message = await queue.get()
+        try:
+            chat_ids = wallet_tracker.get_alert_chat_ids()
+            results = await asyncio.gather(
+                *(send_alert(application.bot, semaphore, chat_id, message) for chat_id in chat_ids),
+                return_exceptions=True
+            )
+            for chat_id, result in zip(chat_ids, results):
+                if isinstance(result, Exception):
+                    logging.error("Error sending notification to %s: %s", chat_id, result)
+                else:
+                    logging.info("Sent alert to chat %s", chat_id)
+        except Exception as e:
+            # Keep the notifier alive so later alerts are still delivered
+            logging.error(f"Error in alert notifier: {e}", exc_info=True)
+        finally:
+            queue.task_done()
+
+def schedule_push_check(job_queue, name: str, when: float, address: str):
+    """
+    Schedule a check of a wallet named in a log notification, merging it into
+    a pending check with the same name so bursts of notifications share one.
+    
+    Args:
+        job_queue: The application's JobQueue
+        name (str): Job name, 'push_check' or 'push_follow_up'
+        when (float): Seconds from now to run the check
+        address (str): The notified wallet address
+    """
+    for job in job_queue.get_jobs_by_name(name):
+        job.data.add(address)
+        return
+    job_queue.run_once(check_transactions, when=when, name=name, data={address})
+
+def handle_log_notification(application, subscriptions: Dict[int, str], message):
+    """
+    Schedule a check of the wallet a log notification belongs to.
+    
+    Args:
+        application: The telegram Application
+        subscriptions (Dict[int, str]): Wallet addresses keyed by subscription id
+        message: A message parsed from the websocket
+    """
+    address = subscriptions.get(getattr(message, 'subscription', None))
+    if address is None:
+        return
+    logging.info(f"Log notification for wallet {address}: {message.result.value.signature}")
+    # Check the wallet shortly, at most once per PUSH_MIN_INTERVAL since any
+    # transaction mentioning it triggers a notification, and once more after
+    # that in case Moralis hasn't indexed the swap yet
+    now = time.monotonic()
+    last_check = wallet_tracker.last_push_checks.get(address)
+    if last_check is None or now - last_check >= PUSH_MIN_INTERVAL:
+        wallet_tracker.last_push_checks[address] = now
+        schedule_push_check(application.job_queue, 'push_check', PUSH_DEBOUNCE_DELAY, address)
+    schedule_push_check(application.job_queue, 'push_follow_up', PUSH_FOLLOW_UP_DELAY, address)
+
+async def watch_wallet_logs(application):
+    """
+    Subscribe to Solana logs mentioning each tracked wallet and schedule an
+    immediate transaction check whenever one of them appears in a transaction.
+    Reconnects and re-subscribes when the set of tracked wallets changes or the
+    connection drops. Addresses that don't parse as public keys are skipped.
+    """
+    while True:
+        subscribed = set(wallet_tracker.wallets)
+        try:
+            async with connect(SOLANA_WS_URL) as ws:
+                subscriptions = {}
+                for request_id, address in enumerate(subscribed, start=1):
+                    if not is_valid_wallet_address(address):
+                        logging.warning(f"Skipping log subscription for invalid wallet address {address}")
+                        continue
+                    await ws.logs_subscribe(RpcTransactionLogsFilterMentions(wallet_pubkey(address)), request_id=request_id)
+                    # Wait for this request's reply, handling notifications for
+                    # earlier subscriptions that arrive in the meantime
+                    answered = False
+                    while not answered:
+                        for message in await ws.recv():
+                            if isinstance(message, SubscriptionResult) and message.id == request_id:
+                                subscriptions[message.result] = address
+                                answered = True
+                            elif isinstance(message, SubscriptionError) and message.id == request_id:
+                                logging.warning(f"Log subscription for wallet {address} failed: {message.error}")
+                                answered = True
+                            else:
+                                handle_log_notification(application, subscriptions, message)
+                logging.info(f"Subscribed to logs for {len(subscriptions)} wallets")
+
+                while set(wallet_tracker.wallets) == subscribed:
                     try:
-                        await context.bot.send_message(
-                            chat_id=wallet,
-                            text=message
-                        )
-                        logging.info(f"Sent multi-sell alert to wallet {wallet}")
-                    except Exception as e:
-                        logging.error(f"Error sending notification to {wallet}: {e}")
-                        
+                        messages = await asyncio.wait_for(ws.recv(), timeout=POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        continue
+
+                    for message in messages:
+                        handle_log_notification(application, subscriptions, message)
+
+                logging.info("Tracked wallets changed, re-subscribing to logs")
         except Exception as e:
-            logging.error(f"Error checking transactions: {e}", exc_info=True)
+            logging.error(f"Error in log subscription: {e}", exc_info=True)
+            await asyncio.sleep(5)
+
+@functools.lru_cache(maxsize=32)
+def wallet_keyboard(prefix: str, wallets_version: int) -> InlineKeyboardMarkup:
+    """
+    Build a keyboard with one button per tracked wallet followed by Back to Menu.
+    Cached per wallets version, so it is only rebuilt after wallets change.
+    
+    Args:
+        prefix (str): Callback data prefix, e.g. 'remove_'
+        wallets_version (int): wallet_tracker.wallets_version, used as the cache key
+    """
+    keyboard = [
+        [InlineKeyboardButton(data['name'], callback_data=f'{prefix}{address}')]
+        for address, data in wallet_tracker.wallets.items()
+    ]
+    keyboard.append([BACK_TO_MENU_BUTTON])
+    return InlineKeyboardMarkup(keyboard)
 
-        await asyncio.sleep(60)  # Check every minute
+async def claim(update, context: CallbackContext):
+    """
+    Handle the /claim <code> command.
+    Links wallets imported without a chat to this chat. The code is only
+    written to the log at startup, so only the bot's operator can claim them.
+    """
+    if not wallet_tracker.has_unowned:
+        await update.message.reply_text("There are no wallets waiting to be claimed.")
+        return
+    if len(context.args) != 1 or not secrets.compare_digest(context.args[0], CLAIM_CODE):
+        wallet_logger.warning(f"Rejected /claim from chat {update.effective_chat.id}")
+        await update.message.reply_text("Invalid claim code.")
+        return
+    count = wallet_tracker.claim_unowned_wallets(update.effective_chat.id)
+    await update.message.reply_text(f"Linked {count} wallets to this chat.")
 
-def start(update, context: CallbackContext):
+async def start(update, context: CallbackContext):
     """
     Handle the /start command.
     Displays the main menu with available options in a 3-column layout.
     """
-    keyboard = [
-        [
-            InlineKeyboardButton("➕ Add", callback_data='add_wallet'),
-            InlineKeyboardButton("➖ Remove", callback_data='remove_wallet'),
-            InlineKeyboardButton("✏️ Modify", callback_data='modify_wallet')
-        ],
-        [
-            InlineKeyboardButton("📝 List", callback_data='list_wallets'),
-            InlineKeyboardButton("🔍 Track", callback_data='track_token'),
-            InlineKeyboardButton("🔔 Alerts", callback_data='toggle_alerts')
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    update.message.reply_text(
+    await update.message.reply_text(
         'Welcome to Solana Wallet Tracker! Choose an option:',
-        reply_markup=reply_markup
+        reply_markup=MAIN_MENU
     )
 
-def show_menu(update, context: CallbackContext):
+async def show_menu(update, context: CallbackContext):
     """
     Display the main menu with available options in a 3-column layout.
     Can be called from both message and callback query handlers.
     """
-    keyboard = [
-        [
-            InlineKeyboardButton("➕ Add", callback_data='add_wallet'),
-            InlineKeyboardButton("➖ Remove", callback_data='remove_wallet'),
-            InlineKeyboardButton("✏️ Modify", callback_data='modify_wallet')
-        ],
-        [
-            InlineKeyboardButton("📝 List", callback_data='list_wallets'),
-            InlineKeyboardButton("🔍 Track", callback_data='track_token'),
-            InlineKeyboardButton("🔔 Alerts", callback_data='toggle_alerts')
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
     if update.message:
-        update.message.reply_text("Choose an option:", reply_markup=reply_markup)
+        await update.message.reply_text("Choose an option:", reply_markup=MAIN_MENU)
+    else:
+        await update.callback_query.message.reply_text("Choose an option:", reply_markup=MAIN_MENU)
+
+# Buttons that only switch the conversation state and ask the user for input:
+# callback data -> (state, prompt)
+INPUT_PROMPTS = {
+    'add_wallet': ('waiting_for_wallet_address', 'Please send me the wallet address you want to track.'),
+    'change_name': ('waiting_for_new_name', 'Please send me the new name for this wallet.'),
+    'change_address': ('waiting_for_new_address', 'Please send me the new address for this wallet.'),
+    'track_token': ('waiting_for_token_address', 'Please send me the token address you want to track.'),
+}
+
+async def prompt_for_input(update, context: CallbackContext):
+    """
+    Handle the buttons listed in INPUT_PROMPTS.
+    Stores the state the next text message belongs to and asks for it.
+    """
+    query = update.callback_query
+    state, prompt = INPUT_PROMPTS[query.data]
+    context.user_data['state'] = state
+    await query.message.edit_text(prompt, reply_markup=BACK_TO_MENU)
+
+async def select_wallet_to_modify(update, context: CallbackContext):
+    """Show the wallet picker for the modify flow."""
+    query = update.callback_query
+    if not wallet_tracker.wallets:
+        await query.message.edit_text('No wallets are being tracked.', reply_markup=BACK_TO_MENU)
+        return
+
+    await query.message.edit_text(
+        'Select a wallet to modify:',
+        reply_markup=wallet_keyboard('modify_', wallet_tracker.wallets_version)
+    )
+
+async def select_wallet_to_remove(update, context: CallbackContext):
+    """Show the wallet picker for the remove flow."""
+    query = update.callback_query
+    if not wallet_tracker.wallets:
+        await query.message.edit_text('No wallets are being tracked.', reply_markup=BACK_TO_MENU)
+        return
+
+    await query.message.edit_text(
+        'Select a wallet to remove:',
+        reply_markup=wallet_keyboard('remove_', wallet_tracker.wallets_version)
+    )
+
+async def list_wallets(update, context: CallbackContext):
+    """Show every tracked wallet with its name, address and when it was added."""
+    query = update.callback_query
+    if not wallet_tracker.wallets:
+        text = '📭 No wallets are being tracked.'
+    else:
+        text = '📋 *Tracked Wallets*\n\n'
+        for addr, data in wallet_tracker.wallets.items():
+            # Add a separator line between wallets
+            text += f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+            # Add wallet name and address with emojis
+            text += f"👤 *Name:* {escape_markdown(data['name'])}\n"
+            text += f"🔑 *Address:* `{addr}`\n"
+            # Add when the wallet was added
+            added_at = datetime.fromisoformat(data['added_at'])
+            text += f"📅 *Added:* {added_at.strftime('%Y-%m-%d %H:%M:%S')}\n"
+            text += "\n"  # Add extra line for spacing
+
+        # Add a summary at the top
+        text = f"📊 *Total Wallets:* {len(wallet_tracker.wallets)}\n\n" + text
+
+    await query.message.edit_text(text, reply_markup=BACK_TO_MENU, parse_mode=ParseMode.MARKDOWN)
+
+async def toggle_alerts(update, context: CallbackContext):
+    """Turn multi-buy/sell alerts on or off."""
+    wallet_tracker.alerts_enabled = not wallet_tracker.alerts_enabled
+    status = 'enabled' if wallet_tracker.alerts_enabled else 'disabled'
+    await update.callback_query.message.edit_text(f'Alerts have been {status}', reply_markup=BACK_TO_MENU)
+
+async def cancel(update, context: CallbackContext):
+    """Abort the current operation and reset the conversation state."""
+    await update.callback_query.message.edit_text('Operation cancelled.', reply_markup=BACK_TO_MENU)
+    context.user_data.clear()
+
+async def modify_selected_wallet(update, context: CallbackContext, address: str):
+    """Remember the picked wallet and ask what to change about it."""
+    context.user_data['modify_address'] = address
+    await update.callback_query.message.edit_text(
+        f'What would you like to modify for {wallet_tracker.get_wallet_name(address)}?',
+        reply_markup=MODIFY_WALLET_MENU
+    )
+
+async def remove_selected_wallet(update, context: CallbackContext, address: str):
+    """Stop tracking the picked wallet."""
+    if wallet_tracker.remove_wallet(address):
+        text = f'Removed wallet {wallet_tracker.get_wallet_name(address)} ({address})'
     else:
-        update.callback_query.message.reply_text("Choose an option:", reply_markup=reply_markup)
+        text = 'Failed to remove wallet'
+    await update.callback_query.message.edit_text(text, reply_markup=BACK_TO_MENU)
+
+# Exact callback data -> handler
+BUTTON_ACTIONS = {
+    'show_menu': show_menu,
+    'modify_wallet': select_wallet_to_modify,
+    'remove_wallet': select_wallet_to_remove,
+    'list_wallets': list_wallets,
+    'toggle_alerts': toggle_alerts,
+    'cancel': cancel,
+    **{data: prompt_for_input for data in INPUT_PROMPTS},
+}
+
+# Callback data prefix -> handler taking the rest of the data (a wallet address).
+# Only consulted when BUTTON_ACTIONS has no exact match, so 'modify_wallet' and
+# 'remove_wallet' never reach these.
+BUTTON_PREFIX_ACTIONS = (
+    ('modify_', modify_selected_wallet),
+    ('remove_', remove_selected_wallet),
+)
 
-def button_handler(update, context: CallbackContext):
+async def button_handler(update, context: CallbackContext):
     """
     Handle button callbacks from the inline keyboard.
-    Manages all menu options and user interactions.
+    Dispatches on the callback data via BUTTON_ACTIONS, falling back to the
+    wallet picker prefixes in BUTTON_PREFIX_ACTIONS.
     """
     query = update.callback_query
-    query.answer()
-
-    if query.data == 'show_menu':
-        show_menu(update, context)
-    elif query.data == 'add_wallet':
-        context.user_data['state'] = 'waiting_for_wallet_address'
-        keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text(
-            'Please send me the wallet address you want to track.',
-            reply_markup=reply_markup
-        )
-    elif query.data == 'modify_wallet':
-        if not wallet_tracker.wallets:
-            keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            query.message.edit_text('No wallets are being tracked.', reply_markup=reply_markup)
+    await query.answer()
+
+    handler = BUTTON_ACTIONS.get(query.data)
+    if handler:
+        await handler(update, context)
+        return
+
+    for prefix, prefix_handler in BUTTON_PREFIX_ACTIONS:
+        if query.data.startswith(prefix):
+            await prefix_handler(update, context, query.data[len(prefix):])
             return
-        
-        keyboard = []
-        for addr, data in wallet_tracker.wallets.items():
-            keyboard.append([InlineKeyboardButton(data['name'], callback_data=f'modify_{addr}')])
-        keyboard.append([InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text('Select a wallet to modify:', reply_markup=reply_markup)
-    elif query.data.startswith('modify_'):
-        address = query.data.replace('modify_', '')
-        context.user_data['modify_address'] = address
-        keyboard = [
-            [InlineKeyboardButton("✏️ Change Name", callback_data='change_name')],
-            [InlineKeyboardButton("🔄 Change Address", callback_data='change_address')],
-            [InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text(
-            f'What would you like to modify for {wallet_tracker.get_wallet_name(address)}?',
-            reply_markup=reply_markup
-        )
-    elif query.data == 'change_name':
-        context.user_data['state'] = 'waiting_for_new_name'
-        keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text(
-            'Please send me the new name for this wallet.',
-            reply_markup=reply_markup
-        )
-    elif query.data == 'change_address':
-        context.user_data['state'] = 'waiting_for_new_address'
-        keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text(
-            'Please send me the new address for this wallet.',
-            reply_markup=reply_markup
+
+async def summary(update, context: CallbackContext):
+    """
+    Handle the /summary command.
+    Shows the most active tokens and the wallets with the largest net flow in
+    USD over the last 24 hours, counting the transactions stored for
+    multi-buy/sell alerts.
+    Names and symbols are escaped since the reply is sent as Markdown.
+    """
+    activity = wallet_tracker.get_activity_summary()
+    if not activity['tokens']:
+        await update.message.reply_text('📭 No activity in the last 24 hours.', reply_markup=BACK_TO_MENU)
+        return
+
+    # Collect the lines and join once instead of growing a string
+    lines = ['📊 *Activity Summary (last 24 hours)*\n', '*Top Tokens*']
+    lines.extend(
+        f"💎 {escape_markdown(token['token_symbol'] or token['token_address'])}: ${token['volume']:,.2f}, "
+        f"{token['tx_count']} txs, {token['wallet_count']} wallets"
+        for token in activity['tokens']
+    )
+    lines.append('\n*Top Wallets by Net Flow*')
+    lines.extend(
+        f"👤 {escape_markdown(wallet_tracker.get_wallet_name(wallet['wallet_address']))}: "
+        f"{'-' if wallet['net_flow'] < 0 else '+'}${abs(wallet['net_flow']):,.2f} ({wallet['tx_count']} txs)"
+        for wallet in activity['wallets']
+    )
+
+    await update.message.reply_text('\n'.join(lines) + '\n', reply_markup=BACK_TO_MENU, parse_mode=ParseMode.MARKDOWN)
+
+async def receive_wallet_address(update, context: CallbackContext, text: str):
+    """First step of adding a wallet: remember the address and ask for a name."""
+    text = text.strip()
+    if not is_valid_wallet_address(text):
+        await update.message.reply_text(
+            'That is not a valid Solana wallet address. Please send it again.',
+            reply_markup=BACK_TO_MENU
         )
-    elif query.data == 'track_token':
-        context.user_data['state'] = 'waiting_for_token_address'
-        keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text(
-            'Please send me the token address you want to track.',
-            reply_markup=reply_markup
+        return
+    context.user_data['wallet_address'] = text
+    context.user_data['state'] = 'waiting_for_wallet_name'
+    await update.message.reply_text('Please send me a name for this wallet.', reply_markup=BACK_TO_MENU)
+
+async def receive_wallet_name(update, context: CallbackContext, text: str):
+    """Second step of adding a wallet: store it for the current chat."""
+    wallet_address = context.user_data['wallet_address']
+    wallet_name = text
+    wallet_tracker.add_wallet(wallet_address, wallet_name, update.effective_chat.id)
+    await update.message.reply_text(
+        f'Added wallet {wallet_name} ({wallet_address})',
+        reply_markup=BACK_TO_MENU
+    )
+    context.user_data.clear()
+
+async def receive_token_address(update, context: CallbackContext, text: str):
+    """Track the given token for every wallet currently tracked."""
+    token_address = text
+    wallet_tracker.add_tracked_token(token_address, list(wallet_tracker.wallets.keys()))
+    await update.message.reply_text(
+        f'Now tracking token {token_address} for all wallets',
+        reply_markup=BACK_TO_MENU
+    )
+    context.user_data.clear()
+
+async def receive_new_name(update, context: CallbackContext, text: str):
+    """Rename the wallet picked in the modify flow."""
+    old_address = context.user_data['modify_address']
+    old_name = wallet_tracker.get_wallet_name(old_address)
+    new_name = text
+
+    # Update the wallet name
+    wallet_tracker.rename_wallet(old_address, new_name)
+
+    await update.message.reply_text(
+        f'Updated wallet name from {old_name} to {new_name}',
+        reply_markup=BACK_TO_MENU
+    )
+    context.user_data.clear()
+
+async def receive_new_address(update, context: CallbackContext, text: str):
+    """Move the wallet picked in the modify flow to a new address."""
+    new_address = text.strip()
+    if not is_valid_wallet_address(new_address):
+        await update.message.reply_text(
+            'That is not a valid Solana wallet address. Please send it again.',
+            reply_markup=BACK_TO_MENU
         )
-    elif query.data == 'remove_wallet':
-        if not wallet_tracker.wallets:
-            keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            query.message.edit_text('No wallets are being tracked.', reply_markup=reply_markup)
-            return
-        
-        keyboard = []
-        for addr, data in wallet_tracker.wallets.items():
-            keyboard.append([InlineKeyboardButton(data['name'], callback_data=f'remove_{addr}')])
-        keyboard.append([InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text('Select a wallet to remove:', reply_markup=reply_markup)
-    elif query.data == 'list_wallets':
-        if not wallet_tracker.wallets:
-            text = '📭 No wallets are being tracked.'
-        else:
-            text = '📋 *Tracked Wallets*\n\n'
-            for addr, data in wallet_tracker.wallets.items():
-                # Add a separator line between wallets
-                text += f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                # Add wallet name and address with emojis
-                text += f"👤 *Name:* {data['name']}\n"
-                text += f"🔑 *Address:* `{addr}`\n"
-                # Add when the wallet was added
-                added_at = datetime.fromisoformat(data['added_at'])
-                text += f"📅 *Added:* {added_at.strftime('%Y-%m-%d %H:%M:%S')}\n"
-                text += "\n"  # Add extra line for spacing
-            
-            # Add a summary at the top
-            text = f"📊 *Total Wallets:* {len(wallet_tracker.wallets)}\n\n" + text
-            
-        keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text(text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN)
-    elif query.data == 'toggle_alerts':
-        wallet_tracker.alerts_enabled = not wallet_tracker.alerts_enabled
-        status = 'enabled' if wallet_tracker.alerts_enabled else 'disabled'
-        keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text(f'Alerts have been {status}', reply_markup=reply_markup)
-    elif query.data.startswith('remove_'):
-        address = query.data.replace('remove_', '')
-        if wallet_tracker.remove_wallet(address):
-            text = f'Removed wallet {wallet_tracker.get_wallet_name(address)} ({address})'
-        else:
-            text = 'Failed to remove wallet'
-        keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text(text, reply_markup=reply_markup)
-    elif query.data == 'cancel':
-        keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text('Operation cancelled.', reply_markup=reply_markup)
-        context.user_data.clear()
-
-def handle_message(update, context: CallbackContext):
+        return
+    old_address = context.user_data['modify_address']
+    old_name = wallet_tracker.get_wallet_name(old_address)
+
+    # Update the wallet address
+    wallet_tracker.change_wallet_address(old_address, new_address)
+
+    await update.message.reply_text(
+        f'Updated wallet address for {old_name} from {old_address} to {new_address}',
+        reply_markup=BACK_TO_MENU
+    )
+    context.user_data.clear()
+
+# Conversation state -> handler for the text message that state is waiting for
+MESSAGE_HANDLERS = {
+    'waiting_for_wallet_address': receive_wallet_address,
+    'waiting_for_wallet_name': receive_wallet_name,
+    'waiting_for_token_address': receive_token_address,
+    'waiting_for_new_name': receive_new_name,
+    'waiting_for_new_address': receive_new_address,
+}
+
+async def handle_message(update, context: CallbackContext):
     """
     Handle text messages from users.
-    Manages the wallet and token addition process.
+    Dispatches on the conversation state set by the menu buttons; messages
+    outside of a flow are ignored.
     """
-    text = update.message.text
-    
-    if context.user_data.get('state') == 'waiting_for_wallet_address':
-        context.user_data['wallet_address'] = text
-        context.user_data['state'] = 'waiting_for_wallet_name'
-        keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        update.message.reply_text('Please send me a name for this wallet.', reply_markup=reply_markup)
-    elif context.user_data.get('state') == 'waiting_for_wallet_name':
-        wallet_address = context.user_data['wallet_address']
-        wallet_name = text
-        wallet_tracker.add_wallet(wallet_address, wallet_name)
-        keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        update.message.reply_text(
-            f'Added wallet {wallet_name} ({wallet_address})',
-            reply_markup=reply_markup
-        )
-        context.user_data.clear()
-    elif context.user_data.get('state') == 'waiting_for_token_address':
-        token_address = text
-        wallet_tracker.add_tracked_token(token_address, list(wallet_tracker.wallets.keys()))
-        keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        update.message.reply_text(
-            f'Now tracking token {token_address} for all wallets',
-            reply_markup=reply_markup
-        )
-        context.user_data.clear()
-    elif context.user_data.get('state') == 'waiting_for_new_name':
-        old_address = context.user_data['modify_address']
-        old_name = wallet_tracker.get_wallet_name(old_address)
-        new_name = text
-        
-        # Update the wallet name
-        wallet_tracker.wallets[old_address]['name'] = new_name
-        wallet_tracker.save_data()
-        
-        keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        update.message.reply_text(
-            f'Updated wallet name from {old_name} to {new_name}',
-            reply_markup=reply_markup
-        )
-        context.user_data.clear()
-    elif context.user_data.get('state') == 'waiting_for_new_address':
-        old_address = context.user_data['modify_address']
-        old_name = wallet_tracker.get_wallet_name(old_address)
-        new_address = text
-        
-        # Update the wallet address
-        wallet_tracker.wallets[new_address] = wallet_tracker.wallets.pop(old_address)
-        wallet_tracker.save_data()
-        
-        keyboard = [[InlineKeyboardButton("⬅️ Back to Menu", callback_data='show_menu')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        update.message.reply_text(
-            f'Updated wallet address for {old_name} from {old_address} to {new_address}',
-            reply_markup=reply_markup
-        )
-        context.user_data.clear()
+    handler = MESSAGE_HANDLERS.get(context.user_data.get('state'))
+    if handler:
+        await handler(update, context, update.message.text)
+
+async def post_init(application):
+    """
+    Start background tasks once the application is initialized.
+    Opens the shared HTTP session and Moralis rate limiter, starts the
+    alert notifier, the log subscription when SOLANA_WS_URL is set, and
+    the keep-alive web server.
+    """
+    application.bot_data['http_session'] = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=100, limit_per_host=32, ttl_dns_cache=300, keepalive_timeout=60)
+    )
+    application.bot_data['alert_queue'] = asyncio.Queue()
+    application.bot_data['rate_limiter'] = TokenBucket(MORALIS_REQUESTS_PER_SECOND, MORALIS_BURST)
+    background_tasks = [asyncio.create_task(send_alerts(application))]
+    if SOLANA_WS_URL:
+        background_tasks.append(asyncio.create_task(watch_wallet_logs(application)))
+    application.bot_data['background_tasks'] = background_tasks
+    application.bot_data['keep_alive'] = await keep_alive()
+
+async def post_shutdown(application):
+    """
+    Stop the background tasks, then close the shared HTTP session, the
+    keep-alive server and the tracker database when the application shuts down.
+    """
+    # post_init may have failed partway, so only close what it created
+    background_tasks = application.bot_data.get('background_tasks', [])
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    http_session = application.bot_data.get('http_session')
+    if http_session is not None:
+        await http_session.close()
+    keep_alive_runner = application.bot_data.get('keep_alive')
+    if keep_alive_runner is not None:
+        await keep_alive_runner.cleanup()
+    wallet_tracker.db.close()
 
 def main():
     """
     Main function to start the bot.
-    Sets up logging, handlers, and starts the bot.
+    Builds the application, registers handlers and the transaction check job,
+    and runs polling on a single event loop.
     """
-    # Create the Updater and pass it your bot's token
-    updater = Updater(os.getenv('TELEGRAM_BOT_TOKEN'), use_context=True)
-
-    # Get the dispatcher to register handlers
-    dispatcher = updater.dispatcher
+    # Create the Application and pass it your bot's token
+    application = ApplicationBuilder().token(os.getenv('TELEGRAM_BOT_TOKEN')).concurrent_updates(True).post_init(post_init).post_shutdown(post_shutdown).build()
 
     # Add handlers
-    dispatcher.add_handler(CommandHandler("start", start))
-    dispatcher.add_handler(CommandHandler("menu", show_menu))
-    dispatcher.add_handler(CallbackQueryHandler(button_handler))
-    dispatcher.add_handler(MessageHandler(Filters.text & ~Filters.command, handle_message))
-
-    # Start async tasks in a separate thread
-    async_thread = threading.Thread(target=run_async_tasks, daemon=True)
-    async_thread.start()
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("menu", show_menu))
+    application.add_handler(CommandHandler("summary", summary))
+    application.add_handler(CommandHandler("claim", claim))
+    application.add_handler(CallbackQueryHandler(button_handler))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
-    # Start keep_alive
-    from keep_alive import keep_alive
-    keep_alive()
+    # Check transactions on the same event loop as polling. With a websocket
+    # subscription the periodic check is only a reconciliation safety net.
+    interval = RECONCILE_INTERVAL if SOLANA_WS_URL else POLL_INTERVAL
+    application.job_queue.run_repeating(check_transactions, interval=interval, first=0)
+    application.job_queue.run_repeating(prune_history, interval=PRUNE_INTERVAL, first=PRUNE_INTERVAL)
 
     # Start the bot
-    updater.start_polling()
-    updater.idle()
-
-def run_async_tasks():
-    """
-    Run async tasks in a separate thread.
-    Currently runs the transaction checking loop.
-    """
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(check_transactions())
-    loop.run_forever()
+    application.run_polling()
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -1,15 +1,16 @@
-from flask import Flask
-from threading import Thread
+from aiohttp import web
 
-app = Flask('')
+async def home(request):
+    return web.Response(text="Bot is running!")
 
-@app.route('/')
-def home():
-    return "Bot is running!"
-
-def run():
-    app.run(host='0.0.0.0', port=8080)
-
-def keep_alive():
-    t = Thread(target=run)
-    t.start() 
\ No newline at end of file
+async def keep_alive():
+    """
+    Serve the keep-alive endpoint on the running event loop.
+    Returns the runner so the caller can clean it up on shutdown.
+    """
+    app = web.Application()
+    app.router.add_get('/', home)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '0.0.0.0', 8080).start()
+    return runner
\ No newline at end of file